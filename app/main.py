@@ -5,22 +5,30 @@ from app.scrapers.costco_scraper import CostcoScraper
 from app.scrapers.walmart_scraper import WalmartScraper
 from app.scrapers.albertsons_scraper import AlbertsonsScraper
 from app.scrapers.chefstore_scraper import ChefStoreScraper
-from app.models.database import SessionLocal, Product, PendingRequest, Base, RequestCache
+from app.scrapers.base_scraper import BaseScraper
+from app.models.database import SessionLocal, Product, PendingRequest, Base, RequestCache, FAILED_STATUSES, ensure_utc_datetime
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any
 import logging
+import json
 from sqlalchemy import inspect
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import httpx
-import time
 import asyncio
+from contextlib import asynccontextmanager
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Store Price API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release the pooled connections shared by all scrapers
+    await BaseScraper.aclose()
+
+app = FastAPI(title="Store Price API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -50,6 +58,12 @@ SUPPORTED_STORES = {
     "costco": CostcoScraper,
 }
 
+# Scrapers hold no per-request state, so one shared instance per store is enough
+SCRAPERS = {store: scraper_class() for store, scraper_class in SUPPORTED_STORES.items()}
+
+# SUPPORTED_STORES is fixed at import time, so encode the listing once
+SUPPORTED_STORES_BODY = json.dumps({"supported_stores": sorted(SUPPORTED_STORES)}).encode()
+
 def get_cached_results(db: Session, urls: list[str]) -> dict:
     """Get cached results that are less than 24 hours old"""
     cached_products = {}
@@ -110,14 +124,15 @@ def remove_pending_requests(db: Session, urls: list[str]):
 
 def cache_results(db: Session, results: dict):
     """Cache the results in the database. Skip products with null prices."""
+    now = datetime.now(timezone.utc)
     for url, product_info_dict in results.items():
         if not product_info_dict or product_info_dict.get('price') is None:
-            logger.info(f"Skipping product with null price for URL: {url}")
+            logger.info("Skipping product with null price for URL: %s", url)
             continue
             
         # Convert dictionary to ProductInfo model
-        product_info_dict['timestamp'] = datetime.now(timezone.utc)
-        product_info = ProductInfo(**product_info_dict)
+        product_info_dict.setdefault('timestamp', now)
+        product_info = ProductInfo.model_construct(**product_info_dict)
             
         # Convert Pydantic Url to string for database storage
         url_str = str(url)
@@ -136,23 +151,74 @@ def cache_results(db: Session, results: dict):
     
     db.commit()
 
-@app.post("/get-prices")
-async def get_prices(request: PriceRequest, db: Session = Depends(get_db)):
+def get_latest_request(db: Session, store: str, url: str):
+    """Get the most recent RequestCache entry for a URL"""
+    return (
+        db.query(RequestCache)
+        .filter(RequestCache.url == url)
+        .filter(RequestCache.store == store)
+        .order_by(RequestCache.update_time.desc())
+        .first()
+    )
+
+def store_scrape_results(store: str, urls: list, results: dict):
+    """Record scraper results in the request and product caches.
+    Runs in a worker thread with its own session, since the request session is closed by then."""
+    db = SessionLocal()
+    # One timestamp for the whole batch; the URLs finished together
+    now = datetime.now(timezone.utc)
+    try:
+        for url in urls:
+            url_str = str(url)
+            cache_entry = get_latest_request(db, store, url_str)
+            
+            if cache_entry:
+                price_info = results.get(url_str)
+                if price_info:
+                    # Update cache entry
+                    cache_entry.status = 'completed'
+                    cache_entry.price_found = True
+                    cache_entry.update_time = now
+                    
+                    # Store in product cache
+                    price_info['timestamp'] = now
+                    cache_results(db, {url_str: price_info})
+                else:
+                    cache_entry.status = 'completed'
+                    cache_entry.price_found = False
+                    cache_entry.update_time = now
+                    cache_entry.error_message = "Price not found"
+                
+                db.commit()
+    finally:
+        db.close()
+
+def mark_requests_finished(store: str, urls: list, status: str, error_message: str):
+    """Mark the RequestCache entries for URLs as failed or timed out"""
+    db = SessionLocal()
+    now = datetime.now(timezone.utc)
+    try:
+        for url in urls:
+            cache_entry = get_latest_request(db, store, str(url))
+            if cache_entry:
+                cache_entry.status = status
+                cache_entry.update_time = now
+                cache_entry.error_message = error_message
+        db.commit()
+    finally:
+        db.close()
+
+def start_price_request(store_name: str, urls: list, now: datetime) -> tuple[dict, list]:
+    """Build the initial results for a /get-prices call and register the URLs that need scraping.
+    Runs in a worker thread with its own session so the blocking queries stay off the event loop."""
+    db = SessionLocal()
     try:
-        store_name = request.store_name.lower()
-        urls = request.urls
-        
-        logger.info(f"Creating scraper for store: {store_name}")
-        scraper_class = SUPPORTED_STORES.get(store_name)
-        
-        if not scraper_class:
-            raise HTTPException(status_code=400, detail=f"Unsupported store: {store_name}")
-        
         # Initialize results dictionary
         final_results = {}
+        request_epoch = int(now.timestamp())
         
         # Clean up stale cache entries
-        cleanup_time = datetime.now(timezone.utc) - timedelta(hours=24)
+        cleanup_time = now - timedelta(hours=24)
         db.query(RequestCache).filter(RequestCache.update_time < cleanup_time).delete()
         db.commit()
         
@@ -160,19 +226,12 @@ async def get_prices(request: PriceRequest, db: Session = Depends(get_db)):
         urls_to_process = []
         for url in urls:
             url_str = str(url)
-            now = datetime.now(timezone.utc)
             
             # Check existing cache entry
-            cache_entry = (
-                db.query(RequestCache)
-                .filter(RequestCache.url == url_str)
-                .filter(RequestCache.store == store_name)
-                .order_by(RequestCache.update_time.desc())
-                .first()
-            )
+            cache_entry = get_latest_request(db, store_name, url_str)
             
             if cache_entry:
-                elapsed_time = (now - cache_entry.start_time).total_seconds()
+                elapsed_time = (now - ensure_utc_datetime(cache_entry.start_time)).total_seconds()
                 
                 if cache_entry.status == 'completed':
                     # Get from product cache if completed
@@ -184,10 +243,10 @@ async def get_prices(request: PriceRequest, db: Session = Depends(get_db)):
                         .first()
                     )
                     
-                    status = RequestStatus(
+                    status = RequestStatus.model_construct(
                         status='completed',
                         job_id=cache_entry.job_id,
-                        start_time=cache_entry.start_time,
+                        start_time=ensure_utc_datetime(cache_entry.start_time),
                         elapsed_time_seconds=elapsed_time,
                         remaining_time_seconds=0,
                         price_found=cache_entry.price_found,
@@ -196,7 +255,7 @@ async def get_prices(request: PriceRequest, db: Session = Depends(get_db)):
                     )
                     
                     if product and not cache_entry.is_stale:
-                        final_results[url_str] = UrlResult(
+                        final_results[url_str] = UrlResult.model_construct(
                             result=product.to_product_info(),
                             request_status=status
                         )
@@ -205,10 +264,10 @@ async def get_prices(request: PriceRequest, db: Session = Depends(get_db)):
                 elif cache_entry.status == 'pending' and cache_entry.is_active:
                     # Still processing
                     remaining_time = max(0, 600 - elapsed_time)  # 600 seconds = 10 minutes
-                    status = RequestStatus(
+                    status = RequestStatus.model_construct(
                         status='running',
                         job_id=cache_entry.job_id,
-                        start_time=cache_entry.start_time,
+                        start_time=ensure_utc_datetime(cache_entry.start_time),
                         elapsed_time_seconds=elapsed_time,
                         remaining_time_seconds=remaining_time,
                         price_found=None,
@@ -216,17 +275,17 @@ async def get_prices(request: PriceRequest, db: Session = Depends(get_db)):
                         details=f"Request running for {elapsed_time:.1f} seconds, {remaining_time:.1f} seconds remaining"
                     )
                     
-                    final_results[url_str] = UrlResult(
+                    final_results[url_str] = UrlResult.model_construct(
                         result=None,
                         request_status=status
                     )
                     continue
                 
-                elif cache_entry.status in ['failed', 'timeout']:
-                    status = RequestStatus(
+                elif cache_entry.status in FAILED_STATUSES:
+                    status = RequestStatus.model_construct(
                         status=cache_entry.status,
                         job_id=cache_entry.job_id,
-                        start_time=cache_entry.start_time,
+                        start_time=ensure_utc_datetime(cache_entry.start_time),
                         elapsed_time_seconds=elapsed_time,
                         remaining_time_seconds=0,
                         price_found=cache_entry.price_found,
@@ -234,7 +293,7 @@ async def get_prices(request: PriceRequest, db: Session = Depends(get_db)):
                         details=f"Request {cache_entry.status} after {elapsed_time:.1f} seconds"
                     )
                     
-                    final_results[url_str] = UrlResult(
+                    final_results[url_str] = UrlResult.model_construct(
                         result=None,
                         request_status=status
                     )
@@ -244,7 +303,7 @@ async def get_prices(request: PriceRequest, db: Session = Depends(get_db)):
             urls_to_process.append(url)
             
             # Generate a unique job ID
-            job_id = f"{store_name}_{int(time.time())}_{len(urls_to_process)}"
+            job_id = f"{store_name}_{request_epoch}_{len(urls_to_process)}"
             
             # Create pending entry
             new_cache_entry = RequestCache(
@@ -256,10 +315,9 @@ async def get_prices(request: PriceRequest, db: Session = Depends(get_db)):
                 update_time=now
             )
             db.add(new_cache_entry)
-            db.commit()
             
             # Add pending result with status
-            status = RequestStatus(
+            status = RequestStatus.model_construct(
                 status='running',
                 job_id=job_id,
                 start_time=now,
@@ -270,178 +328,155 @@ async def get_prices(request: PriceRequest, db: Session = Depends(get_db)):
                 details="Request just started"
             )
             
-            final_results[url_str] = UrlResult(
+            final_results[url_str] = UrlResult.model_construct(
                 result=None,
                 request_status=status
             )
         
-        # Process new URLs in background if any
-        if urls_to_process:
-            # Create an instance of the scraper
-            scraper = scraper_class()
+        db.commit()
+        return final_results, urls_to_process
+    finally:
+        db.close()
+
+def refresh_price_request(store_name: str, urls_to_process: list, pending: set, tick: datetime) -> tuple[dict, dict, list]:
+    """Check on URLs still being scraped for a /get-prices call.
+    Returns results for URLs that completed, fresh running statuses for URLs in pending, and the URLs still outstanding.
+    Runs in a worker thread with its own session; results are applied by the caller on the event loop."""
+    db = SessionLocal()
+    try:
+        completed = {}
+        running = {}
+        
+        # Check if any URLs are now in product cache
+        new_cached = get_cached_results(db, urls_to_process)
+        if new_cached:
+            for url_str, product_info in new_cached.items():
+                cache_entry = get_latest_request(db, store_name, url_str)
+                
+                if cache_entry:
+                    elapsed_time = (tick - ensure_utc_datetime(cache_entry.start_time)).total_seconds()
+                    status = RequestStatus.model_construct(
+                        status='completed',
+                        job_id=cache_entry.job_id,
+                        start_time=ensure_utc_datetime(cache_entry.start_time),
+                        elapsed_time_seconds=elapsed_time,
+                        remaining_time_seconds=0,
+                        price_found=cache_entry.price_found,
+                        error_message=cache_entry.error_message,
+                        details=f"Request completed in {elapsed_time:.1f} seconds"
+                    )
+                    
+                    completed[url_str] = UrlResult.model_construct(
+                        result=product_info,
+                        request_status=status
+                    )
             
-            # Function to process URLs in background
-            async def process_urls_background():
-                try:
-                    logger.info(f"Starting background processing for URLs: {urls_to_process}")
+            urls_to_process = [url for url in urls_to_process if str(url) not in new_cached]
+        
+        # Update status for remaining URLs
+        for url in urls_to_process:
+            url_str = str(url)
+            if url_str in pending:
+                cache_entry = get_latest_request(db, store_name, url_str)
+                
+                if cache_entry:
+                    elapsed_time = (tick - ensure_utc_datetime(cache_entry.start_time)).total_seconds()
+                    remaining_time = max(0, 600 - elapsed_time)
                     
-                    try:
-                        # Set a 10-minute timeout for the scraping
-                        async with asyncio.timeout(600):  # 10 minutes in seconds
-                            results = await scraper.get_prices(urls_to_process)
-                            
-                            # Update cache and store results
-                            for url in urls_to_process:
-                                url_str = str(url)
-                                cache_entry = (
-                                    db.query(RequestCache)
-                                    .filter(RequestCache.url == url_str)
-                                    .filter(RequestCache.store == store_name)
-                                    .order_by(RequestCache.update_time.desc())
-                                    .first()
-                                )
-                                
-                                if cache_entry:
-                                    price_info = results.get(url_str)
-                                    if price_info:
-                                        # Update cache entry
-                                        cache_entry.status = 'completed'
-                                        cache_entry.price_found = True
-                                        cache_entry.update_time = datetime.now(timezone.utc)
-                                        
-                                        # Store in product cache
-                                        price_info['timestamp'] = datetime.now(timezone.utc)
-                                        cache_results(db, {url_str: price_info})
-                                    else:
-                                        cache_entry.status = 'completed'
-                                        cache_entry.price_found = False
-                                        cache_entry.update_time = datetime.now(timezone.utc)
-                                        cache_entry.error_message = "Price not found"
-                                    
-                                    db.commit()
-                                    
-                    except asyncio.TimeoutError:
-                        logger.error("Background processing timed out after 10 minutes")
-                        # Update cache entries as timed out
-                        for url in urls_to_process:
-                            url_str = str(url)
-                            cache_entry = (
-                                db.query(RequestCache)
-                                .filter(RequestCache.url == url_str)
-                                .filter(RequestCache.store == store_name)
-                                .order_by(RequestCache.update_time.desc())
-                                .first()
-                            )
-                            if cache_entry:
-                                cache_entry.status = 'timeout'
-                                cache_entry.update_time = datetime.now(timezone.utc)
-                                cache_entry.error_message = "Request timed out after 10 minutes"
-                        db.commit()
-                    except Exception as e:
-                        logger.error(f"Error in background processing: {str(e)}")
-                        # Update cache entries as failed
-                        for url in urls_to_process:
-                            url_str = str(url)
-                            cache_entry = (
-                                db.query(RequestCache)
-                                .filter(RequestCache.url == url_str)
-                                .filter(RequestCache.store == store_name)
-                                .order_by(RequestCache.update_time.desc())
-                                .first()
-                            )
-                            if cache_entry:
-                                cache_entry.status = 'failed'
-                                cache_entry.update_time = datetime.now(timezone.utc)
-                                cache_entry.error_message = str(e)
-                        db.commit()
+                    status = RequestStatus.model_construct(
+                        status='running',
+                        job_id=cache_entry.job_id,
+                        start_time=ensure_utc_datetime(cache_entry.start_time),
+                        elapsed_time_seconds=elapsed_time,
+                        remaining_time_seconds=remaining_time,
+                        price_found=None,
+                        error_message=None,
+                        details=f"Request running for {elapsed_time:.1f} seconds, {remaining_time:.1f} seconds remaining"
+                    )
                     
-                except Exception as e:
-                    logger.error(f"Background task error: {str(e)}")
-            
-            # Start background processing
-            asyncio.create_task(process_urls_background())
+                    running[url_str] = status
         
-        # Wait up to 1 minute for immediate results
-        if urls_to_process:
+        return completed, running, urls_to_process
+    finally:
+        db.close()
+
+# Keep references to running background scrapes so they are not garbage collected
+background_tasks = set()
+
+@app.post("/get-prices")
+async def get_prices(request: PriceRequest):
+    store_name = request.store_name.lower()
+    urls = request.urls
+    
+    logger.debug("Using scraper for store: %s", store_name)
+    scraper = SCRAPERS.get(store_name)
+    
+    if not scraper:
+        raise HTTPException(status_code=400, detail=f"Unsupported store: {store_name}")
+    
+    # One request timestamp for cleanup, cache checks and new entries alike
+    now = datetime.now(timezone.utc)
+    
+    # The session is synchronous, so all database work runs in worker threads
+    final_results, urls_to_process = await asyncio.to_thread(start_price_request, store_name, urls, now)
+    
+    # Process new URLs in background if any
+    if urls_to_process:
+        # Function to process URLs in background
+        async def process_urls_background(urls: list):
             try:
-                async with asyncio.timeout(60):  # 1 minute timeout
-                    while True:
-                        # Check if any URLs are now in product cache
-                        new_cached = get_cached_results(db, urls_to_process)
-                        if new_cached:
-                            for url_str, product_info in new_cached.items():
-                                cache_entry = (
-                                    db.query(RequestCache)
-                                    .filter(RequestCache.url == url_str)
-                                    .filter(RequestCache.store == store_name)
-                                    .order_by(RequestCache.update_time.desc())
-                                    .first()
-                                )
-                                
-                                if cache_entry:
-                                    elapsed_time = (datetime.now(timezone.utc) - cache_entry.start_time).total_seconds()
-                                    status = RequestStatus(
-                                        status='completed',
-                                        job_id=cache_entry.job_id,
-                                        start_time=cache_entry.start_time,
-                                        elapsed_time_seconds=elapsed_time,
-                                        remaining_time_seconds=0,
-                                        price_found=cache_entry.price_found,
-                                        error_message=cache_entry.error_message,
-                                        details=f"Request completed in {elapsed_time:.1f} seconds"
-                                    )
-                                    
-                                    final_results[url_str] = UrlResult(
-                                        result=product_info,
-                                        request_status=status
-                                    )
-                            
-                            urls_to_process = [url for url in urls_to_process if str(url) not in new_cached]
-                            if not urls_to_process:
-                                break
-                        
-                        # Update status for remaining URLs
-                        for url in urls_to_process:
-                            url_str = str(url)
-                            if url_str in final_results:
-                                cache_entry = (
-                                    db.query(RequestCache)
-                                    .filter(RequestCache.url == url_str)
-                                    .filter(RequestCache.store == store_name)
-                                    .order_by(RequestCache.update_time.desc())
-                                    .first()
-                                )
-                                
-                                if cache_entry:
-                                    elapsed_time = (datetime.now(timezone.utc) - cache_entry.start_time).total_seconds()
-                                    remaining_time = max(0, 600 - elapsed_time)
-                                    
-                                    status = RequestStatus(
-                                        status='running',
-                                        job_id=cache_entry.job_id,
-                                        start_time=cache_entry.start_time,
-                                        elapsed_time_seconds=elapsed_time,
-                                        remaining_time_seconds=remaining_time,
-                                        price_found=None,
-                                        error_message=None,
-                                        details=f"Request running for {elapsed_time:.1f} seconds, {remaining_time:.1f} seconds remaining"
-                                    )
-                                    
-                                    final_results[url_str].request_status = status
-                        
-                        await asyncio.sleep(5)
-            except asyncio.TimeoutError:
-                logger.info("Timeout reached, returning partial results with status")
-        
-        return PriceResponse(results=final_results)
+                logger.info("Starting background processing for URLs: %s", urls)
+                
+                try:
+                    # Set a 10-minute timeout for the scraping
+                    async with asyncio.timeout(600):  # 10 minutes in seconds
+                        results = await scraper.get_prices(urls)
+                    
+                    # Database writes block, so keep them off the event loop
+                    await asyncio.to_thread(store_scrape_results, store_name, urls, results)
+                    
+                except asyncio.TimeoutError:
+                    logger.error("Background processing timed out after 10 minutes")
+                    await asyncio.to_thread(
+                        mark_requests_finished, store_name, urls, 'timeout', "Request timed out after 10 minutes"
+                    )
+                except Exception as e:
+                    logger.error("Error in background processing: %s", e)
+                    await asyncio.to_thread(mark_requests_finished, store_name, urls, 'failed', str(e))
+                
+            except Exception as e:
+                logger.error("Background task error: %s", e)
         
-    except Exception as e:
-        logger.error(f"Error processing request: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        # Start background processing on a copy, since the wait loop below narrows urls_to_process
+        task = asyncio.create_task(process_urls_background(list(urls_to_process)))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    
+    # Wait up to 1 minute for immediate results
+    if urls_to_process:
+        try:
+            async with asyncio.timeout(60):  # 1 minute timeout
+                while True:
+                    completed, running, urls_to_process = await asyncio.to_thread(
+                        refresh_price_request, store_name, urls_to_process, set(final_results), datetime.now(timezone.utc)
+                    )
+                    final_results.update(completed)
+                    for url_str, status in running.items():
+                        final_results[url_str].request_status = status
+                    if not urls_to_process:
+                        break
+                    
+                    await asyncio.sleep(5)
+        except asyncio.TimeoutError:
+            logger.info("Timeout reached, returning partial results with status")
+    
+    # Serialize once in pydantic-core instead of going through jsonable_encoder
+    response = PriceResponse(results=final_results)
+    return Response(content=response.model_dump_json(), media_type="application/json")
 
 @app.get("/supported-stores")
 def get_supported_stores():
-    return {"supported_stores": list(SUPPORTED_STORES.keys())}
+    return Response(content=SUPPORTED_STORES_BODY, media_type="application/json")
 
 @app.get("/health")
 def health_check():
@@ -509,7 +544,7 @@ def get_table_data(table_name: str, db: Session = Depends(get_db)) -> Dict[str,
         }
         
     except Exception as e:
-        logger.error(f"Error fetching data from table {table_name}: {str(e)}")
+        logger.error("Error fetching data from table %s: %s", table_name, e)
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching data from table: {str(e)}"
@@ -538,29 +573,22 @@ def get_tables(db: Session = Depends(get_db)):
             
         return JSONResponse(content=database_info)
     except Exception as e:
-        logger.error(f"Error getting database tables: {str(e)}")
+        logger.error("Error getting database tables: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/raw-scrape")
 async def get_raw_html(request: PriceRequest, db: Session = Depends(get_db)):
     """Get raw HTML/JSON response without processing"""
-    try:
-        store_name = request.store_name.lower()
-        urls = request.urls
-        
-        logger.info(f"Creating scraper for store: {store_name}")
-        scraper_class = SUPPORTED_STORES.get(store_name)
-        
-        if not scraper_class:
-            raise HTTPException(status_code=400, detail=f"Unsupported store: {store_name}")
-            
-        scraper = scraper_class()
-        
-        logger.info(f"Fetching raw content for URLs: {urls}")
-        raw_results = await scraper.get_raw_content(urls)
-        
-        return JSONResponse(content=raw_results)
-        
-    except Exception as e:
-        logger.error(f"Error processing raw scrape request: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    store_name = request.store_name.lower()
+    urls = request.urls
+    
+    logger.debug("Using scraper for store: %s", store_name)
+    scraper = SCRAPERS.get(store_name)
+    
+    if not scraper:
+        raise HTTPException(status_code=400, detail=f"Unsupported store: {store_name}")
+    
+    logger.debug("Fetching raw content for URLs: %s", urls)
+    raw_results = await scraper.get_raw_content(urls)
+    
+    return JSONResponse(content=raw_results)
\ No newline at end of file
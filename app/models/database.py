@@ -18,6 +18,18 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create base class for models
 Base = declarative_base()
 
+# Request statuses after which a RequestCache entry is no longer running
+FAILED_STATUSES = frozenset({'failed', 'timeout'})
+TERMINAL_STATUSES = FAILED_STATUSES | {'completed'}
+
+def ensure_utc_datetime(dt: Optional[datetime]) -> Optional[datetime]:
+    """Return dt as an aware UTC datetime (SQLite hands back naive values)"""
+    if dt is None or dt.tzinfo is timezone.utc:
+        return dt
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
 class Product(Base):
     __tablename__ = "product"
 
@@ -58,7 +70,7 @@ class Product(Base):
 
     def to_product_info(self):
         from app.schemas.request_schemas import ProductInfo
-        return ProductInfo(
+        return ProductInfo.model_construct(
             store=self.store,
             url=self.url,
             name=self.name,
@@ -72,7 +84,7 @@ class Product(Base):
             brand=self.brand,
             sku=self.sku,
             category=self.category,
-            timestamp=self.timestamp
+            timestamp=ensure_utc_datetime(self.timestamp)
         )
 
 class RequestCache(Base):
@@ -91,16 +103,16 @@ class RequestCache(Base):
     @property
     def is_active(self) -> bool:
         """Check if the request is still active (less than 10 minutes old)"""
-        if self.status in ['completed', 'failed', 'timeout']:
+        if self.status in TERMINAL_STATUSES:
             return False
         now = datetime.now(timezone.utc)
-        return (now - self.start_time).total_seconds() < 600  # 10 minutes
+        return (now - ensure_utc_datetime(self.start_time)).total_seconds() < 600  # 10 minutes
 
     @property
     def is_stale(self) -> bool:
         """Check if the request is stale (older than 24 hours)"""
         now = datetime.now(timezone.utc)
-        return (now - self.update_time).total_seconds() > 86400  # 24 hours
+        return (now - ensure_utc_datetime(self.update_time)).total_seconds() > 86400  # 24 hours
 
 class PendingRequest(Base):
     __tablename__ = "pending_request"
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, ConfigDict, HttpUrl
 from typing import List, Optional, Dict
 from datetime import datetime
 
@@ -7,6 +7,8 @@ class PriceRequest(BaseModel):
     urls: List[HttpUrl]
 
 class ProductInfo(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     store: str
     url: str
     name: str
@@ -23,6 +25,8 @@ class ProductInfo(BaseModel):
     timestamp: datetime
 
 class RequestStatus(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     status: str  # 'completed', 'running', 'failed', 'timeout'
     job_id: Optional[str]
     start_time: datetime
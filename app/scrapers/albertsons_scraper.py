@@ -1,10 +1,32 @@
 from typing import Dict, List
-import json
+from functools import lru_cache
 import logging
+import re
+import orjson
 from .base_scraper import BaseScraper
 
 logger = logging.getLogger(__name__)
 
+# Product ID in product detail URLs, e.g. .../product-details.970555.html
+_PRODUCT_ID_RE = re.compile(r'product-details\.(\d+)\.html')
+
+# Price formatters, bound once instead of re-parsing a format spec per product
+_fmt_usd = "${:.2f}".format
+_fmt_usd_per_lb = "${:.2f}/Lb".format
+
+@lru_cache(maxsize=4096)
+def _transform_url(url: str) -> str:
+    """Map a product detail URL to its pdpdata API URL (pure, so safe to memoize)"""
+    match = _PRODUCT_ID_RE.search(url)
+    if match:
+        # Transform to API URL format
+        return f"https://www.albertsons.com/abs/pub/xapi/product/v2/pdpdata?bpn={match.group(1)}&banner=albertsons&storeId=177"
+    return url
+
+def _as_price(value):
+    """orjson already returns JSON numbers as int/float; only strings need parsing"""
+    return float(value) if isinstance(value, str) else value
+
 class AlbertsonsScraper(BaseScraper):
     def __init__(self):
         super().__init__(mode="async")  # Use async parallel mode instead of batch
@@ -24,9 +46,14 @@ class AlbertsonsScraper(BaseScraper):
 
     async def extract_product_info(self, html: str, url: str) -> Dict:
         """Extract product information from Albertsons API response"""
+        # ScraperAPI hands back HTML error/captcha pages as-is; don't try to parse them as JSON
+        if not html or html.lstrip()[:1] not in ('{', '['):
+            logger.warning("Non-JSON response body for %s", url)
+            return None
+        
         try:
             # Parse the JSON response
-            data = json.loads(html)
+            data = orjson.loads(html)
             
             # Get the product from catalog response
             product = data.get('catalog', {}).get('response', {}).get('docs', [{}])[0]
@@ -34,65 +61,67 @@ class AlbertsonsScraper(BaseScraper):
                 logger.error("No product found in catalog response")
                 return None
             
+            # Read each field once
+            pid = product.get('pid')
+            price = _as_price(product.get('price')) or 0.0
+            price_per = _as_price(product.get('pricePer'))
+            
             # Build the standardized product information
             product_info = {
                 "store": "Albertsons",
-                "url": f"https://www.albertsons.com/shop/product-details.{product.get('pid')}.html",
+                "url": f"https://www.albertsons.com/shop/product-details.{pid}.html",
                 "name": product.get('name'),
-                "price": float(product.get('price', 0)),
-                "price_string": f"${product.get('price', '0')}",
-                "price_per_unit": float(product.get('pricePer', 0)) if product.get('pricePer') else None,
-                "price_per_unit_string": f"${product.get('pricePer', '0')}/Lb" if product.get('pricePer') else None,
+                "price": price,
+                "price_string": _fmt_usd(price) if price else None,
+                "price_per_unit": price_per or None,
+                "price_per_unit_string": _fmt_usd_per_lb(price_per) if price_per else None,
                 "store_id": product.get('storeId'),
                 "store_address": None,  # Not available in this API response
                 "store_zip": None,  # Not available in this API response
                 "brand": None,  # Not directly available in this response
-                "sku": product.get('pid'),
+                "sku": pid,
                 "category": f"{product.get('departmentName', '')}/{product.get('shelfName', '')}"
             }
 
-            logger.info(f"Successfully extracted product info: {product_info}")
+            logger.debug("Successfully extracted product info for %s", url)
             return product_info
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response: {e}")
+        except orjson.JSONDecodeError as e:
+            logger.error("Failed to parse JSON response: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Error extracting product info: {e}")
+            logger.exception("Error extracting product info")
             return None
 
     def transform_url(self, url) -> str:
         """Transform product detail URL to API URL"""
         # Convert Pydantic Url to string
-        url = str(url)
-        
-        if "product-details." in url:
-            # Extract product ID from URL
-            product_id = url.split("product-details.")[-1].split(".")[0]
-            # Transform to API URL format
-            return f"https://www.albertsons.com/abs/pub/xapi/product/v2/pdpdata?bpn={product_id}&banner=albertsons&storeId=177"
-        return url
+        return _transform_url(str(url))
 
     async def get_prices(self, urls: List[str]) -> Dict[str, Dict]:
         """Override to transform URLs before processing"""
-        # Store original URLs
-        original_urls = [str(url) for url in urls]
-        
-        # Transform URLs to API format
-        api_urls = [self.transform_url(url) for url in urls]
+        # Group original URLs by API URL so each product is only fetched once
+        urls_by_api_url = {}
+        for url in urls:
+            orig_url = str(url)
+            urls_by_api_url.setdefault(self.transform_url(orig_url), []).append(orig_url)
         
         # Call parent implementation with transformed URLs
-        results = await super().get_prices(api_urls)
+        results = await super().get_prices(list(urls_by_api_url))
         
         # Map results back to original URLs
         original_results = {}
-        for orig_url, api_url in zip(original_urls, api_urls):
-            if api_url in results and results[api_url]:
-                # Ensure the result uses the original product URL
-                result = results[api_url].copy()
-                result['url'] = orig_url
-                original_results[orig_url] = result
+        for api_url, orig_urls in urls_by_api_url.items():
+            result = results.get(api_url)
+            if not result:
+                for orig_url in orig_urls:
+                    original_results[orig_url] = None
+            elif len(orig_urls) == 1:
+                # Sole owner of this result, so point it at the original product URL in place
+                result['url'] = orig_urls[0]
+                original_results[orig_urls[0]] = result
             else:
-                original_results[orig_url] = None
+                for orig_url in orig_urls:
+                    original_results[orig_url] = {**result, 'url': orig_url}
                 
         return original_results
\ No newline at end of file
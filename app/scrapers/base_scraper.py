@@ -2,9 +2,11 @@ from abc import ABC, abstractmethod
 from typing import Dict, List, Optional, Literal
 import logging
 import httpx
+import orjson
 import time
 import os
 import asyncio
+import random
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 
@@ -14,13 +16,128 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Job payloads are encoded with orjson, so the content type has to be set by hand
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Error reported for URLs skipped while the ScraperAPI circuit breaker is open
+CIRCUIT_OPEN_ERROR = "ScraperAPI unavailable, request skipped"
+
+# Optional product fields in output order, with the type each is coerced to; empty values become None
+OPTIONAL_OUTPUT_FIELDS = (
+    ("price_string", str),
+    ("price_per_unit", float),
+    ("price_per_unit_string", str),
+    ("store_id", str),
+    ("store_address", str),
+    ("store_zip", str),
+    ("brand", str),
+    ("sku", str),
+    ("category", str),
+)
+
 class BaseScraper(ABC):
     API_KEY = os.environ["SCRAPER_API_KEY"]
     TIMEOUT_MINUTES = 10  # Timeout after 10 minutes
+    MAX_CONCURRENT_JOBS = 10  # Max ScraperAPI jobs in flight per call in async mode
+    # Seconds to wait before each successive status poll of a job; the last entry repeats
+    POLL_INTERVALS = (0.5, 1, 2, 3, 5, 10, 15, 20, 30)
+    CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive job submission failures that open the circuit
+    CIRCUIT_FAILURE_WINDOW = 30  # Seconds within which those failures must occur
+    CIRCUIT_OPEN_SECONDS = 60  # How long to fail fast once the circuit is open
+    _client: Optional[httpx.AsyncClient] = None  # Shared by every scraper instance
+    # Circuit breaker state is shared too, since every store goes through the same ScraperAPI account
+    _failure_count = 0
+    _first_failure_at = 0.0
+    _open_until = 0.0
     
     def __init__(self, mode: Literal["batch", "async"] = "batch"):
         self.scraper_config = self.get_scraper_config()
         self.mode = mode
+        # Store config is static, so serialize the job payloads once up to the URL field;
+        # each request only encodes its URL(s) and closes the object
+        self._job_payload_prefix = orjson.dumps({"apiKey": self.API_KEY, **self.scraper_config})[:-1] + b',"url":'
+        self._batch_payload_prefix = orjson.dumps({"apiKey": self.API_KEY, "apiParams": self.scraper_config})[:-1] + b',"urls":'
+
+    @staticmethod
+    def _get_client() -> httpx.AsyncClient:
+        """Return the application-wide HTTP client, creating it on first use"""
+        if BaseScraper._client is None or BaseScraper._client.is_closed:
+            # HTTP/2 multiplexes the many concurrent status polls over one connection; keep enough
+            # idle connections alive between poll ticks that HTTP/1.1 fallbacks avoid new TLS handshakes
+            BaseScraper._client = httpx.AsyncClient(
+                verify=False,
+                http2=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60),
+                timeout=httpx.Timeout(30.0, connect=10.0),
+            )
+        return BaseScraper._client
+
+    @staticmethod
+    async def aclose():
+        """Close the shared HTTP client (called on application shutdown)"""
+        if BaseScraper._client is not None:
+            await BaseScraper._client.aclose()
+            BaseScraper._client = None
+
+    @staticmethod
+    def _circuit_open() -> bool:
+        """Whether ScraperAPI calls should be skipped because of recent failures"""
+        return time.monotonic() < BaseScraper._open_until
+
+    def _record_failure(self):
+        """Count a failed job submission, opening the circuit once the threshold is hit"""
+        now = time.monotonic()
+        if now - BaseScraper._first_failure_at > self.CIRCUIT_FAILURE_WINDOW:
+            BaseScraper._failure_count = 0
+            BaseScraper._first_failure_at = now
+        BaseScraper._failure_count += 1
+        if BaseScraper._failure_count >= self.CIRCUIT_FAILURE_THRESHOLD:
+            BaseScraper._open_until = now + self.CIRCUIT_OPEN_SECONDS
+            BaseScraper._failure_count = 0
+            logger.warning("ScraperAPI failing, skipping requests for %d seconds", self.CIRCUIT_OPEN_SECONDS)
+
+    @staticmethod
+    def _record_success():
+        """Reset the failure count after a successful job submission"""
+        BaseScraper._failure_count = 0
+
+    async def _submit(self, client: httpx.AsyncClient, api_url: str, payload: bytes) -> httpx.Response:
+        """POST a job submission, feeding the outcome to the circuit breaker.
+        Only throttling, server errors and transport errors count as failures; a 4xx for a bad URL does not."""
+        try:
+            response = await client.post(api_url, content=payload, headers=JSON_HEADERS)
+        except httpx.TransportError:
+            self._record_failure()
+            raise
+        if response.status_code == 200:
+            self._record_success()
+        elif self._is_retryable(response.status_code):
+            self._record_failure()
+        return response
+
+    @staticmethod
+    def _err(message: str, ts: Optional[str] = None) -> Dict:
+        """Build a raw result for a failed URL; pass ts to share one timestamp across a batch"""
+        return {"error": message, "timestamp": ts or datetime.now(timezone.utc).isoformat()}
+
+    def _poll_delay(self, attempt: int, retry_after: float = 0) -> float:
+        """Seconds to wait before status poll number attempt + 1.
+        Jittered so concurrent jobs don't poll in lockstep, and never shorter than the API's Retry-After."""
+        delay = self.POLL_INTERVALS[min(attempt, len(self.POLL_INTERVALS) - 1)]
+        return max(delay + random.uniform(0, 0.5), retry_after)
+
+    @staticmethod
+    def _is_retryable(status_code: int) -> bool:
+        """Whether an HTTP status means ScraperAPI is throttling or temporarily failing"""
+        return status_code == 429 or status_code >= 500
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> float:
+        """Seconds requested by a Retry-After header, or 0 if absent/unparseable"""
+        try:
+            return float(response.headers.get("Retry-After", 0))
+        except ValueError:
+            return 0
 
     @abstractmethod
     def get_scraper_config(self) -> Dict:
@@ -36,18 +153,33 @@ class BaseScraper(ABC):
         """Get raw HTML/JSON content for URLs without processing
         Returns a dictionary with URLs as keys and dictionaries containing content/error and timestamp as values
         """
-        url_strings = [str(url) for url in urls]
+        # Results are keyed by URL, so duplicates would only spend extra API credits for the same entry
+        url_strings = list(dict.fromkeys(str(url) for url in urls))
         results = {}
         
-        async with httpx.AsyncClient(verify=False) as client:
-            if self.mode == "batch":
-                # Use batch processing for multiple URLs
-                results = await self._get_raw_batch(url_strings, client)
-            else:
-                # Process URLs individually
-                tasks = [self._get_raw_single(url, client) for url in url_strings]
-                task_results = await asyncio.gather(*tasks)
-                results = dict(zip(url_strings, task_results))
+        if self._circuit_open():
+            ts = datetime.now(timezone.utc).isoformat()
+            return {url: self._err(CIRCUIT_OPEN_ERROR, ts) for url in url_strings}
+
+        # Reuse the shared client so keep-alive connections survive across requests
+        client = self._get_client()
+        if self.mode == "batch":
+            # Use batch processing for multiple URLs
+            results = await self._get_raw_batch(url_strings, client)
+        else:
+            # Process URLs individually, bounded so large requests don't exceed the API's concurrency
+            semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_JOBS)
+
+            async def get_raw_bounded(url: str) -> Dict:
+                async with semaphore:
+                    # The circuit may have opened while this URL was waiting for a slot
+                    if self._circuit_open():
+                        return self._err(CIRCUIT_OPEN_ERROR)
+                    return await self._get_raw_single(url, client)
+
+            tasks = [get_raw_bounded(url) for url in url_strings]
+            task_results = await asyncio.gather(*tasks)
+            results = dict(zip(url_strings, task_results))
         
         return results
 
@@ -56,48 +188,39 @@ class BaseScraper(ABC):
         try:
             # Submit job to ScraperAPI
             api_url = "https://async.scraperapi.com/jobs"
-            payload = {
-                "url": url,
-                "apiKey": self.API_KEY,
-                **self.scraper_config
-            }
+            payload = self._job_payload_prefix + orjson.dumps(url) + b'}'
             
-            response = await client.post(api_url, json=payload)
+            response = await self._submit(client, api_url, payload)
             if response.status_code != 200:
-                return {
-                    "error": f"API request failed with status {response.status_code}",
-                    "timestamp": datetime.now(timezone.utc).isoformat()
-                }
+                return self._err(f"API request failed with status {response.status_code}")
 
-            job_data = response.json()
+            job_data = orjson.loads(response.content)
             job_id = job_data.get('id')
             status_url = job_data.get('statusUrl')
 
             if not job_id:
-                return {
-                    "error": "No job ID received",
-                    "timestamp": datetime.now(timezone.utc).isoformat()
-                }
+                return self._err("No job ID received")
 
             # Poll for job completion
-            start_time = time.time()
+            start_time = time.monotonic()
+            attempt = 0
             while True:
                 # Check timeout
-                if (time.time() - start_time) / 60 >= self.TIMEOUT_MINUTES:
-                    return {
-                        "error": "Job timed out",
-                        "timestamp": datetime.now(timezone.utc).isoformat()
-                    }
+                if (time.monotonic() - start_time) / 60 >= self.TIMEOUT_MINUTES:
+                    return self._err("Job timed out")
 
                 status_response = await client.get(status_url)
-                status_data = status_response.json()
-                status = status_data.get('status')
+                if status_response.status_code != 200:
+                    if not self._is_retryable(status_response.status_code):
+                        return self._err(f"Status request failed with status {status_response.status_code}")
+                    # Throttled or temporarily failing: the body isn't job JSON, just wait and poll again
+                    status = None
+                else:
+                    status_data = orjson.loads(status_response.content)
+                    status = status_data.get('status')
 
                 if status == 'failed':
-                    return {
-                        "error": "Job failed",
-                        "timestamp": datetime.now(timezone.utc).isoformat()
-                    }
+                    return self._err("Job failed")
                 elif status == 'finished':
                     html = status_data.get('response', {}).get('body')
                     if html:
@@ -106,97 +229,116 @@ class BaseScraper(ABC):
                             "timestamp": datetime.now(timezone.utc).isoformat()
                         }
                     else:
-                        return {
-                            "error": "No HTML content in response",
-                            "timestamp": datetime.now(timezone.utc).isoformat()
-                        }
+                        return self._err("No HTML content in response")
 
-                await asyncio.sleep(5)  # Wait before next poll
+                # Back off so quick jobs return fast without hammering the API on slow ones
+                await asyncio.sleep(self._poll_delay(attempt, self._retry_after(status_response)))
+                attempt += 1
                 
         except Exception as e:
-            return {
-                "error": str(e),
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            }
+            return self._err(str(e))
 
     async def _get_raw_batch(self, urls: List[str], client: httpx.AsyncClient) -> Dict[str, Dict]:
         """Get raw content for multiple URLs using batch processing"""
         try:
             # Submit batch job
             api_url = "https://async.scraperapi.com/batchjobs"
-            payload = {
-                "urls": urls,
-                "apiKey": self.API_KEY,
-                "apiParams": self.scraper_config
-            }
+            payload = self._batch_payload_prefix + orjson.dumps(urls) + b'}'
 
-            response = await client.post(api_url, json=payload)
+            response = await self._submit(client, api_url, payload)
             if response.status_code != 200:
-                return {url: {
-                    "error": f"Batch API request failed with status {response.status_code}",
-                    "timestamp": datetime.now(timezone.utc).isoformat()
-                } for url in urls}
+                ts = datetime.now(timezone.utc).isoformat()
+                return {url: self._err(f"Batch API request failed with status {response.status_code}", ts) for url in urls}
 
-            jobs = response.json()
-            job_statuses = {job['id']: {'status': 'running', 'url': job['url'], 'statusUrl': job['statusUrl']} for job in jobs}
+            jobs = orjson.loads(response.content)
+            start_time = time.monotonic()
+            # Each job follows its own poll schedule, so quick jobs aren't held back by slow ones
+            job_statuses = {job['id']: {
+                'status': 'running', 'url': job['url'], 'statusUrl': job['statusUrl'],
+                'attempt': 0, 'next_poll': start_time
+            } for job in jobs}
             results = {}
-            start_time = time.time()
 
             # Poll for all jobs completion
             while any(status['status'] == 'running' for status in job_statuses.values()):
-                if (time.time() - start_time) / 60 >= self.TIMEOUT_MINUTES:
+                if (time.monotonic() - start_time) / 60 >= self.TIMEOUT_MINUTES:
                     # Handle timeout for remaining jobs
+                    ts = datetime.now(timezone.utc).isoformat()
                     for job_info in job_statuses.values():
                         if job_info['status'] == 'running':
-                            results[job_info['url']] = {
-                                "error": "Job timed out",
-                                "timestamp": datetime.now(timezone.utc).isoformat()
-                            }
+                            results[job_info['url']] = self._err("Job timed out", ts)
                     break
 
-                for job_id, job_info in job_statuses.items():
-                    if job_info['status'] == 'running':
-                        status_response = await client.get(job_info['statusUrl'])
-                        status_data = status_response.json()
-                        current_status = status_data.get('status')
-                        
-                        if current_status == 'failed':
+                # Poll every due job at once, so a tick costs one round trip instead of one per job
+                now = time.monotonic()
+                due = [job_info for job_info in job_statuses.values()
+                       if job_info['status'] == 'running' and job_info['next_poll'] <= now]
+                status_responses = await asyncio.gather(
+                    *(client.get(job_info['statusUrl']) for job_info in due), return_exceptions=True
+                )
+                # One timestamp for everything that completed in this tick
+                ts = datetime.now(timezone.utc).isoformat()
+                polled_at = time.monotonic()
+
+                for job_info, status_response in zip(due, status_responses):
+                    retry_after = 0
+                    if isinstance(status_response, Exception):
+                        # One job's poll failing shouldn't discard the rest of the batch; try it again later
+                        logger.warning("Status poll for %s failed: %s", job_info['url'], status_response)
+                        current_status = None
+                    elif status_response.status_code != 200:
+                        if not self._is_retryable(status_response.status_code):
                             job_info['status'] = 'failed'
+                            results[job_info['url']] = self._err(
+                                f"Status request failed with status {status_response.status_code}", ts
+                            )
+                            continue
+                        # Throttled or temporarily failing: the body isn't job JSON, just wait and poll again
+                        current_status = None
+                        retry_after = self._retry_after(status_response)
+                    else:
+                        try:
+                            status_data = orjson.loads(status_response.content)
+                        except orjson.JSONDecodeError:
+                            logger.warning("Unreadable status response for %s", job_info['url'])
+                            status_data = {}
+                        current_status = status_data.get('status')
+                        retry_after = self._retry_after(status_response)
+                    
+                    if current_status == 'failed':
+                        job_info['status'] = 'failed'
+                        results[job_info['url']] = self._err("Job failed", ts)
+                    elif current_status == 'finished':
+                        job_info['status'] = 'finished'
+                        html = status_data.get('response', {}).get('body')
+                        if html:
                             results[job_info['url']] = {
-                                "error": "Job failed",
-                                "timestamp": datetime.now(timezone.utc).isoformat()
+                                "content": html,
+                                "timestamp": ts
                             }
-                        elif current_status == 'finished':
-                            job_info['status'] = 'finished'
-                            html = status_data.get('response', {}).get('body')
-                            if html:
-                                results[job_info['url']] = {
-                                    "content": html,
-                                    "timestamp": datetime.now(timezone.utc).isoformat()
-                                }
-                            else:
-                                results[job_info['url']] = {
-                                    "error": "No HTML content in response",
-                                    "timestamp": datetime.now(timezone.utc).isoformat()
-                                }
-
-                await asyncio.sleep(5)
+                        else:
+                            results[job_info['url']] = self._err("No HTML content in response", ts)
+                    else:
+                        job_info['next_poll'] = polled_at + self._poll_delay(job_info['attempt'], retry_after)
+                        job_info['attempt'] += 1
+
+                # Sleep until the next job is due
+                next_poll = min((job_info['next_poll'] for job_info in job_statuses.values()
+                                 if job_info['status'] == 'running'), default=None)
+                if next_poll is not None:
+                    await asyncio.sleep(max(0, next_poll - time.monotonic()))
 
             # Fill in any missing results
+            ts = datetime.now(timezone.utc).isoformat()
             for url in urls:
                 if url not in results:
-                    results[url] = {
-                        "error": "Job processing failed",
-                        "timestamp": datetime.now(timezone.utc).isoformat()
-                    }
+                    results[url] = self._err("Job processing failed", ts)
 
             return results
 
         except Exception as e:
-            return {url: {
-                "error": str(e),
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            } for url in urls}
+            ts = datetime.now(timezone.utc).isoformat()
+            return {url: self._err(str(e), ts) for url in urls}
 
     def standardize_output(self, product_info: Dict) -> Dict:
         """Standardize the output format across all scrapers"""
@@ -204,21 +346,17 @@ class BaseScraper(ABC):
             return None
 
         # Ensure all required fields are present with proper types
+        get = product_info.get
+        price = get("price")
         standardized = {
-            "store": str(product_info.get("store", "")),
-            "url": str(product_info.get("url", "")),
-            "name": str(product_info.get("name", "")),
-            "price": float(product_info["price"]) if product_info.get("price") is not None else None,
-            "price_string": str(product_info.get("price_string")) if product_info.get("price_string") else None,
-            "price_per_unit": float(product_info.get("price_per_unit")) if product_info.get("price_per_unit") else None,
-            "price_per_unit_string": str(product_info.get("price_per_unit_string")) if product_info.get("price_per_unit_string") else None,
-            "store_id": str(product_info.get("store_id")) if product_info.get("store_id") else None,
-            "store_address": str(product_info.get("store_address")) if product_info.get("store_address") else None,
-            "store_zip": str(product_info.get("store_zip")) if product_info.get("store_zip") else None,
-            "brand": str(product_info.get("brand")) if product_info.get("brand") else None,
-            "sku": str(product_info.get("sku")) if product_info.get("sku") else None,
-            "category": str(product_info.get("category")) if product_info.get("category") else None
+            "store": str(get("store", "")),
+            "url": str(get("url", "")),
+            "name": str(get("name", "")),
+            "price": float(price) if price is not None else None,
         }
+        for key, coerce in OPTIONAL_OUTPUT_FIELDS:
+            value = get(key)
+            standardized[key] = coerce(value) if value else None
 
         return standardized
 
@@ -235,7 +373,7 @@ class BaseScraper(ABC):
                     product_info = await self.extract_product_info(result["content"], url)
                     processed_results[url] = self.standardize_output(product_info) if product_info else None
                 except Exception as e:
-                    logger.error(f"Error processing URL {url}: {str(e)}")
+                    logger.error("Error processing URL %s: %s", url, e, exc_info=True)
                     processed_results[url] = None
             else:
                 processed_results[url] = None
@@ -20,7 +20,7 @@ class ChefStoreScraper(BaseScraper):
 
     async def extract_product_info(self, html: str, url: str) -> Dict:
         try:
-            logger.info(f"Starting to extract product info for URL: {url}")
+            logger.debug("Starting to extract product info for URL: %s", url)
             selector = Selector(text=html)
             
             # Get JSON-LD script content
@@ -29,15 +29,13 @@ class ChefStoreScraper(BaseScraper):
                 logger.error("Could not find JSON-LD script in HTML")
                 return None
             
-            logger.info("Found JSON-LD script, parsing JSON")
+            logger.debug("Found JSON-LD script, parsing JSON")
             data = json.loads(scripts)
             
             # Extract store information
             store_link = selector.css('a.store-address-link::attr(href)').get()
-            try:
-                store_id = store_link.split('/')[-2] if store_link else None
-            except (IndexError, AttributeError):
-                store_id = None
+            link_parts = store_link.split('/') if store_link else []
+            store_id = link_parts[-2] if len(link_parts) > 1 else None
             store_address = selector.css('a.store-address-link::text').get()
             
             # Extract price from offers
@@ -49,6 +47,8 @@ class ChefStoreScraper(BaseScraper):
                     elif "price" in data["offers"]:
                         price = data["offers"]["price"]
             
+            brand = data.get("brand")
+            
             result = {
                 "store": "chefstore",
                 "url": url,
@@ -58,13 +58,13 @@ class ChefStoreScraper(BaseScraper):
                 "store_id": store_id,
                 "store_address": store_address,
                 "sku": data.get("sku"),
-                "brand": data.get("brand", {}).get("name"),
+                "brand": brand.get("name") if isinstance(brand, dict) else brand,
                 "category": data.get("category")
             }
             
-            logger.info(f"Successfully extracted product info: {result}")
+            logger.debug("Successfully extracted product info: %r", result)
             return result
             
         except Exception as e:
-            logger.error(f"Error parsing ChefStore product info: {str(e)}")
+            logger.error("Error parsing ChefStore product info: %s", e)
             return None
@@ -1,13 +1,14 @@
-import logging
 import re
 import urllib.parse
 from bs4 import BeautifulSoup
 from typing import Dict, Optional, Tuple
 
-from pydantic_core import Url
 from .base_scraper import BaseScraper, logger
-import os
-from datetime import datetime
+
+# Compiled once at import; these run against every script tag on a product page
+_PRICE_RE = re.compile(r'\$(\d+\.\d+)')
+_PRICE_PER_LB_RE = re.compile(r'pricingUnitString":\s*"\$(\d+\.\d+)\s*/\s*lb"')
+_POSTAL_CODE_RE = re.compile(r'postalCode":\s*"(\d{5})"')
 
 
 class CostcoScraper(BaseScraper):
@@ -30,13 +31,13 @@ class CostcoScraper(BaseScraper):
             return None, None
             
         price_text = price_element.get_text()
-        logger.info(f"Found price text: {price_text}")
+        logger.debug("Found price text: %s", price_text)
         
-        price_match = re.search(r'\$(\d+\.\d+)', price_text)
+        price_match = _PRICE_RE.search(price_text)
         if price_match:
             price = float(price_match.group(1))
             price_string = f"${price}"
-            logger.info(f"Extracted price: {price}")
+            logger.debug("Extracted price: %s", price)
             return price, price_string
         
         return None, None
@@ -55,18 +56,18 @@ class CostcoScraper(BaseScraper):
             
             # Look for price per pound
             if not price_per_unit:
-                price_per_unit_match = re.search(r'pricingUnitString":\s*"\$(\d+\.\d+)\s*/\s*lb"', decoded_content)
+                price_per_unit_match = _PRICE_PER_LB_RE.search(decoded_content)
                 if price_per_unit_match:
                     price_per_unit = float(price_per_unit_match.group(1))
                     price_per_unit_string = f"${price_per_unit} /lb"
-                    logger.info(f"Found price per unit in script: {price_per_unit_string}")
+                    logger.debug("Found price per unit in script: %s", price_per_unit_string)
             
             # Look for delivery location
             if not delivery_location:
-                location_match = re.search(r'postalCode":\s*"(\d{5})"', decoded_content)
+                location_match = _POSTAL_CODE_RE.search(decoded_content)
                 if location_match:
                     delivery_location = location_match.group(1)
-                    logger.info(f"Found delivery location in script: {delivery_location}")
+                    logger.debug("Found delivery location in script: %s", delivery_location)
             
             # Break if we found both pieces of information
             if price_per_unit and delivery_location:
@@ -77,25 +78,10 @@ class CostcoScraper(BaseScraper):
     async def extract_product_info(self, html: str, url: str) -> Dict:
         """Extract product information from Costco HTML content."""
         try:
-            logger.info(f"Starting to extract product info for URL: {url}")
-            logger.info(f"HTML length: {len(html)}")
+            logger.debug("Starting to extract product info for URL: %s", url)
+            logger.debug("HTML length: %d", len(html))
             
-            #saving HTML locally
-            # Create directory if it doesn't exist
-            os.makedirs('sample_files/costco', exist_ok=True)
-
-            # Create filename with timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'costco_{timestamp}.html'
-            filepath = os.path.join('sample_files', 'costco', filename)
-
-            # Save the HTML content
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(html)
-
-            print(f'File saved to: {filepath}')
-
-            soup = BeautifulSoup(html, 'html.parser')
+            soup = BeautifulSoup(html, 'lxml')  # C parser, much faster than html.parser
             
             # Extract price from visible elements
             price, price_string = self._extract_price_from_element(soup.find('div', class_='e-1wia3ii'))
@@ -106,7 +92,7 @@ class CostcoScraper(BaseScraper):
             # Extract product name
             title_element = soup.find('span', class_='e-1y16mcr')
             name = title_element.get_text().strip() if title_element else None
-            logger.info(f"Extracted name: {name}")
+            logger.debug("Extracted name: %s", name)
             
             product_info = {
                 'store': 'costco',
@@ -119,9 +105,9 @@ class CostcoScraper(BaseScraper):
                 'delivery_location': delivery_location
             }
             
-            logger.info(f"Successfully extracted product info: {product_info}")
+            logger.debug("Successfully extracted product info: %r", product_info)
             return product_info
             
         except Exception as e:
-            logger.error(f"Error parsing Costco product info: {str(e)}")
+            logger.error("Error parsing Costco product info: %s", e)
             return None 
\ No newline at end of file
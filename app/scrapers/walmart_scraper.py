@@ -1,8 +1,11 @@
-import json
-from parsel import Selector
+import re
+import orjson
 from .base_scraper import BaseScraper, logger
 from typing import Dict
 
+# Only the __NEXT_DATA__ payload is needed, so scan for it instead of building an lxml tree of the whole page
+_NEXT_DATA_RE = re.compile(r'<script[^>]*\bid="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL)
+
 class WalmartScraper(BaseScraper):
     def get_scraper_config(self) -> dict:
         return {
@@ -18,15 +21,14 @@ class WalmartScraper(BaseScraper):
 
     async def extract_product_info(self, html: str, url: str) -> Dict:
         try:
-            logger.info(f"Starting to extract product info for URL: {url}")
-            selector = Selector(text=html)
-            scripts = selector.css("script#__NEXT_DATA__::text").get()
-            if not scripts:
+            logger.debug("Starting to extract product info for URL: %s", url)
+            match = _NEXT_DATA_RE.search(html)
+            if not match:
                 logger.error("Could not find __NEXT_DATA__ script in HTML")
                 return None
             
-            logger.info("Found __NEXT_DATA__ script, parsing JSON")
-            data = json.loads(scripts)
+            logger.debug("Found __NEXT_DATA__ script, parsing JSON")
+            data = orjson.loads(match.group(1))
 
             product = (
                 data.get("props", {})
@@ -49,10 +51,10 @@ class WalmartScraper(BaseScraper):
                 "price_string": price_string
             }
             
-            logger.info(f"Successfully extracted product info: {result}")
+            logger.debug("Successfully extracted product info: %r", result)
             return result
         except Exception as e:
-            logger.error(f"Error parsing Walmart product info: {str(e)}")
+            logger.error("Error parsing Walmart product info: %s", e)
             return None
 
     # Remove this method as it's not needed and could cause confusion